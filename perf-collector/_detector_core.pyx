@@ -0,0 +1,180 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""
+Ahead-of-time compiled RingBuffer and detector kernels.
+Build in place with `cythonize -i _detector_core.pyx`; when the extension
+is not built, anomaly_detector falls back to the pure-Python RingBuffer and
+the Numba kernels in _detector_kernels.
+"""
+
+import numpy as np
+from libc.stdint cimport int64_t
+from libc.math cimport sqrt
+
+cdef enum:
+    REFRESH_INTERVAL = 256
+
+
+cdef class RingBuffer:
+    """Fixed-size circular buffer holding samples as parallel NumPy arrays.
+
+    Keeps a running sum and sum of squares so mean/variance are O(1); the
+    sums are recomputed from the stored values every REFRESH_INTERVAL pushes
+    to stop floating-point drift from accumulating.
+    """
+
+    cdef public object values
+    cdef public object times
+    cdef public Py_ssize_t capacity
+    cdef public Py_ssize_t head
+    cdef public Py_ssize_t count
+    cdef public double sum
+    cdef public double sum_sq
+    cdef double[::1] _values
+    cdef int64_t[::1] _times
+    cdef Py_ssize_t _pushes
+
+    def __init__(self, Py_ssize_t capacity):
+        self.capacity = capacity
+        self.values = np.empty(capacity, dtype=np.float64)
+        self.times = np.empty(capacity, dtype=np.int64)  # time.monotonic_ns()
+        self._values = self.values
+        self._times = self.times
+        self.head = 0
+        self.count = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self._pushes = 0
+
+    def __len__(self):
+        return self.count
+
+    cpdef void push(self, double value, int64_t timestamp):
+        """Store a sample, overwriting the oldest one once the buffer is full."""
+        cdef double old
+        if self.count == self.capacity:
+            old = self._values[self.head]
+            self.sum += value - old
+            self.sum_sq += value * value - old * old
+        else:
+            self.sum += value
+            self.sum_sq += value * value
+            self.count += 1
+        self._values[self.head] = value
+        self._times[self.head] = timestamp
+        self.head += 1
+        if self.head == self.capacity:
+            self.head = 0
+
+        self._pushes += 1
+        if self._pushes % REFRESH_INTERVAL == 0:
+            self.refresh()
+
+    cpdef void refresh(self):
+        """Recompute the running sums exactly from the stored values."""
+        cdef Py_ssize_t i
+        cdef double v, total = 0.0, total_sq = 0.0
+        # Once full every slot is live; before that the live slots are [0, count)
+        for i in range(self.count):
+            v = self._values[i]
+            total += v
+            total_sq += v * v
+        self.sum = total
+        self.sum_sq = total_sq
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    @property
+    def variance(self):
+        """Sample variance (ddof=1) of the buffered values."""
+        cdef Py_ssize_t n = self.count
+        if n < 2:
+            return 0.0
+        return max((self.sum_sq - self.sum * self.sum / n) / (n - 1), 0.0)
+
+    def recent(self, n=None):
+        """Return the newest n values (all by default) in insertion order."""
+        cdef Py_ssize_t k = self.count if n is None or n > self.count else n
+        if k <= self.head:
+            # Contiguous slice, no copy
+            return self.values[self.head - k:self.head]
+        # Wrapped around the end of the storage
+        return np.concatenate((self.values[self.capacity - (k - self.head):],
+                               self.values[:self.head]))
+
+    def push_many(self, values, timestamps):
+        """Store a batch of samples (oldest first) with at most two slice copies."""
+        cdef Py_ssize_t k = len(values)
+        cdef Py_ssize_t first, rest
+        if k >= self.capacity:
+            # Only the newest `capacity` samples survive
+            np.copyto(self.values, values[k - self.capacity:])
+            np.copyto(self.times, timestamps[k - self.capacity:])
+            self.head = 0
+            self.count = self.capacity
+        else:
+            first = min(k, self.capacity - self.head)
+            np.copyto(self.values[self.head:self.head + first], values[:first])
+            np.copyto(self.times[self.head:self.head + first], timestamps[:first])
+            rest = k - first
+            if rest:
+                np.copyto(self.values[:rest], values[first:])
+                np.copyto(self.times[:rest], timestamps[first:])
+            self.head = (self.head + k) % self.capacity
+            self.count = min(self.count + k, self.capacity)
+        self.refresh()
+
+
+def cache_variance_kernel(double mean, double variance, double baseline_var):
+    """Return (is_anomaly, variance_ratio) from a window's running mean/variance.
+
+    A negative baseline_var means no baseline is known yet; half the current
+    variance is used instead.
+    """
+    cdef double std_dev = sqrt(variance)
+    cdef double variance_ratio
+    if baseline_var < 0:
+        baseline_var = variance * 0.5
+    variance_ratio = variance / baseline_var if baseline_var > 0 else 1.0
+
+    # Threshold for variance anomaly (attacks cause 3x+ variance increase)
+    return variance_ratio > 3.0 and std_dev > mean * 0.3, variance_ratio
+
+
+cdef double _mean(const double[:] values) noexcept nogil:
+    cdef Py_ssize_t i, n = values.shape[0]
+    cdef double total = 0.0
+    for i in range(n):
+        total += values[i]
+    return total / n
+
+
+def branch_kernel(const double[:] misses, const double[:] instrs, double threshold):
+    """Return (is_anomaly, misprediction_rate) for recent branch counters."""
+    cdef double avg_misses, avg_instructions, misprediction_rate
+    if misses.shape[0] == 0 or instrs.shape[0] == 0:
+        return False, 0.0
+
+    with nogil:
+        avg_misses = _mean(misses)
+        avg_instructions = _mean(instrs)
+    if avg_instructions == 0:
+        return False, 0.0
+
+    misprediction_rate = avg_misses / avg_instructions
+    return misprediction_rate > threshold, misprediction_rate
+
+
+def memory_kernel(double avg_loads, double avg_stores, double avg_llc_misses):
+    """Return (is_anomaly, confidence) from recent memory access counter averages."""
+    # Spectre attacks often show high load/store ratio and elevated LLC misses
+    cdef double load_store_ratio = avg_loads / avg_stores if avg_stores > 0 else 0.0
+    cdef double llc_miss_rate = avg_llc_misses / avg_loads if avg_loads > 0 else 0.0
+
+    suspicious_load_ratio = load_store_ratio > 5.0  # Much more loads than stores
+    high_llc_miss_rate = llc_miss_rate > 0.1  # >10% LLC miss rate
+
+    is_anomaly = suspicious_load_ratio and high_llc_miss_rate
+    confidence = (load_store_ratio / 10.0) + (llc_miss_rate * 10.0)
+    return is_anomaly, min(confidence, 1.0)
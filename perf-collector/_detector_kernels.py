@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Numeric kernels for the Spectre anomaly detector.
+Compiled with Numba when it is installed, plain Python/NumPy otherwise.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        """Fallback decorator used when Numba is not available."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+# Windows are 10-100 samples, too small to amortize parallel=True thread spawn
+JIT_OPTIONS = {"cache": True, "fastmath": True, "nogil": True}
+
+
+@njit(**JIT_OPTIONS)
+def cache_variance_kernel(mean, variance, baseline_var):
+    """Return (is_anomaly, variance_ratio) from a window's running mean/variance.
+
+    A negative baseline_var means no baseline is known yet; half the current
+    variance is used instead. (NaN can't be used as the sentinel: fastmath
+    lets the compiler assume it never occurs.)
+    """
+    std_dev = np.sqrt(variance)
+
+    if baseline_var < 0:
+        baseline_var = variance * 0.5
+    variance_ratio = variance / baseline_var if baseline_var > 0 else 1.0
+
+    # Threshold for variance anomaly (attacks cause 3x+ variance increase)
+    is_anomaly = variance_ratio > 3.0 and std_dev > mean * 0.3
+    return is_anomaly, variance_ratio
+
+
+@njit(**JIT_OPTIONS)
+def branch_kernel(misses, instrs, threshold):
+    """Return (is_anomaly, misprediction_rate) for recent branch counters."""
+    if misses.shape[0] == 0 or instrs.shape[0] == 0:
+        return False, 0.0
+
+    avg_misses = misses.sum() / misses.shape[0]
+    avg_instructions = instrs.sum() / instrs.shape[0]
+    if avg_instructions == 0:
+        return False, 0.0
+
+    misprediction_rate = avg_misses / avg_instructions
+    return misprediction_rate > threshold, misprediction_rate
+
+
+@njit(**JIT_OPTIONS)
+def memory_kernel(avg_loads, avg_stores, avg_llc_misses):
+    """Return (is_anomaly, confidence) from recent memory access counter averages."""
+    # Spectre attacks often show high load/store ratio and elevated LLC misses
+    load_store_ratio = avg_loads / avg_stores if avg_stores > 0 else 0.0
+    llc_miss_rate = avg_llc_misses / avg_loads if avg_loads > 0 else 0.0
+
+    suspicious_load_ratio = load_store_ratio > 5.0  # Much more loads than stores
+    high_llc_miss_rate = llc_miss_rate > 0.1  # >10% LLC miss rate
+
+    is_anomaly = suspicious_load_ratio and high_llc_miss_rate
+    confidence = (load_store_ratio / 10.0) + (llc_miss_rate * 10.0)
+    return is_anomaly, min(confidence, 1.0)
+
+
+try:
+    # Ahead-of-time compiled versions: no JIT compile at startup
+    from _detector_core import cache_variance_kernel, branch_kernel, memory_kernel
+except ImportError:
+    pass
+
+
+def warm_up() -> None:
+    """Trigger JIT compilation ahead of the first real sample."""
+    empty = np.empty(0, dtype=np.float64)
+    cache_variance_kernel(0.0, 0.0, -1.0)
+    branch_kernel(empty, empty, 0.0)
+    memory_kernel(0.0, 0.0, 0.0)
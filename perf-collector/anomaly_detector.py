@@ -6,12 +6,18 @@ and cache timing analysis.
 """
 
 import json
+import time
+import contextlib
 import numpy as np
 import logging
 from typing import Dict, List, Any, Optional, Tuple
-from datetime import datetime, timedelta
-from collections import deque
-import statistics
+from datetime import datetime
+from dataclasses import dataclass
+try:
+    import orjson
+except ImportError:
+    orjson = None
+from _detector_kernels import cache_variance_kernel, branch_kernel, memory_kernel, warm_up
 # Add at the top of your existing file
 from enhanced_cloud_monitor import integrate_enhanced_monitoring
 
@@ -19,21 +25,183 @@ from enhanced_cloud_monitor import integrate_enhanced_monitoring
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@contextlib.contextmanager
+def detection_guard(stage: str = "Spectre detection"):
+    """Log and suppress errors escaping a detection call at the caller boundary."""
+    try:
+        yield
+    except Exception as e:
+        logger.error(f"Error in {stage}: {e}")
+
+class RingBuffer:
+    """Fixed-size circular buffer holding samples as parallel NumPy arrays.
+
+    Keeps a running sum and sum of squares so mean/variance are O(1); the
+    sums are recomputed from the stored values every REFRESH_INTERVAL pushes
+    to stop floating-point drift from accumulating.
+    """
+
+    REFRESH_INTERVAL = 256
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.values = np.empty(capacity, dtype=np.float64)
+        self.times = np.empty(capacity, dtype=np.int64)  # time.monotonic_ns()
+        self.head = 0
+        self.count = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self._pushes = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def push(self, value: float, timestamp: int) -> None:
+        """Store a sample, overwriting the oldest one once the buffer is full."""
+        value = float(value)
+        if self.count == self.capacity:
+            old = float(self.values[self.head])
+            self.sum += value - old
+            self.sum_sq += value * value - old * old
+        else:
+            self.sum += value
+            self.sum_sq += value * value
+            self.count += 1
+        self.values[self.head] = value
+        self.times[self.head] = timestamp
+        self.head = (self.head + 1) % self.capacity
+
+        self._pushes += 1
+        if self._pushes % self.REFRESH_INTERVAL == 0:
+            self.refresh()
+
+    def refresh(self) -> None:
+        """Recompute the running sums exactly from the stored values."""
+        live = self.recent()
+        self.sum = float(live.sum())
+        self.sum_sq = float(np.dot(live, live))
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (ddof=1) of the buffered values."""
+        n = self.count
+        if n < 2:
+            return 0.0
+        return max((self.sum_sq - self.sum * self.sum / n) / (n - 1), 0.0)
+
+    def recent(self, n: Optional[int] = None) -> np.ndarray:
+        """Return the newest n values (all by default) in insertion order."""
+        if n is None or n > self.count:
+            n = self.count
+        if n <= self.head:
+            # Contiguous slice, no copy
+            return self.values[self.head - n:self.head]
+        # Wrapped around the end of the storage
+        return np.concatenate((self.values[self.capacity - (n - self.head):],
+                               self.values[:self.head]))
+
+    def push_many(self, values: np.ndarray, timestamps: np.ndarray) -> None:
+        """Store a batch of samples (oldest first) with at most two slice copies."""
+        k = len(values)
+        if k >= self.capacity:
+            # Only the newest `capacity` samples survive
+            np.copyto(self.values, values[k - self.capacity:])
+            np.copyto(self.times, timestamps[k - self.capacity:])
+            self.head = 0
+            self.count = self.capacity
+        else:
+            first = min(k, self.capacity - self.head)
+            np.copyto(self.values[self.head:self.head + first], values[:first])
+            np.copyto(self.times[self.head:self.head + first], timestamps[:first])
+            rest = k - first
+            if rest:
+                np.copyto(self.values[:rest], values[first:])
+                np.copyto(self.times[:rest], timestamps[first:])
+            self.head = (self.head + k) % self.capacity
+            self.count = min(self.count + k, self.capacity)
+        self.refresh()
+
+try:
+    # Compiled replacement, available once _detector_core.pyx has been built
+    from _detector_core import RingBuffer
+except ImportError:
+    pass
+
+@dataclass(slots=True)
+class DetectionResult:
+    """Outcome of one detect_spectre_signature call, kept flat until serialized."""
+    timestamp_ns: int  # time.monotonic_ns()
+    performance_counters: Dict[str, float]
+    risk_score: float = 0.0
+    overall_risk: bool = False
+    attack_type: Optional[str] = None
+    cache_anomaly: bool = False
+    cache_score: float = 0.0
+    branch_anomaly: bool = False
+    branch_score: float = 0.0
+    mem_anomaly: bool = False
+    mem_score: float = 0.0
+    timestamp: Optional[str] = None  # ISO wall-clock time, set when logged
+    
+    def indicators(self) -> Dict[str, Dict[str, Any]]:
+        """Per-indicator anomaly flags and scores."""
+        return {
+            "cache_timing": {"anomaly": self.cache_anomaly, "score": self.cache_score},
+            "branch_prediction": {"anomaly": self.branch_anomaly, "score": self.branch_score},
+            "memory_access": {"anomaly": self.mem_anomaly, "score": self.mem_score}
+        }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the JSON-compatible detection dictionary."""
+        result = {
+            "timestamp_ns": self.timestamp_ns,
+            "performance_counters": self.performance_counters,
+            "spectre_indicators": self.indicators(),
+            "overall_spectre_risk": self.overall_risk,
+            "risk_score": self.risk_score,
+            "attack_type": self.attack_type
+        }
+        if self.timestamp is not None:
+            result["timestamp"] = self.timestamp
+        return result
+
 class SpectreAnomalyDetector:
+    # Windows read by the cache, branch and memory detectors
+    DETECTOR_METRICS = ("cache_misses", "branch_misses", "branch_instructions",
+                        "mem_loads", "mem_stores", "llc_misses")
+    
     def __init__(self, config_file: str = "metrics_config.json"):
         """Initialize Spectre anomaly detector with configuration."""
         self.config = self.load_config(config_file)
+        # Samples are stamped with the monotonic clock; this pair maps it to wall time
+        self._epoch_ns = time.time_ns()
+        self._mono_epoch_ns = time.monotonic_ns()
         self.performance_windows = {}
-        self.cache_timing_history = deque(maxlen=1000)
-        self.spectre_signatures = deque(maxlen=500)
-        self.baseline_metrics = {}
+        self.cache_timing_history = RingBuffer(1000)
+        # Circular store of the last 500 detections, written at _sig_head
+        self._sig_buf = [None] * 500
+        self._sig_times_ns = np.empty(500, dtype=np.int64)
+        self._sig_head = 0
+        self._sig_count = 0
+        # Baseline statistics keyed by bare metric name
+        self._baseline_mean = {}
+        self._baseline_var = {}
+        # Scratch rows for mem_loads, mem_stores, llc_misses (last 20 samples)
+        self._mem_stack = np.empty((3, 20), dtype=np.float64)
         self.initialize_spectre_thresholds()
+        # Pay the one-time JIT compile cost before the first sample arrives
+        warm_up()
         
     def load_config(self, config_file: str) -> Dict[str, Any]:
         """Load configuration from JSON file."""
         try:
-            with open(config_file, 'r') as f:
-                return json.load(f)
+            with open(config_file, 'rb') as f:
+                data = f.read()
+            return orjson.loads(data) if orjson else json.loads(data)
         except FileNotFoundError:
             logger.warning(f"Config file {config_file} not found, using defaults")
             return self.get_default_spectre_config()
@@ -65,22 +233,72 @@ class SpectreAnomalyDetector:
     
     def initialize_spectre_thresholds(self):
         """Initialize thresholds for Spectre-specific metrics."""
-        for metric_name, config in self.config.get("spectre_metrics", {}).items():
+        # Config is fixed for the detector's lifetime; resolve it once
+        self._window_size = int(self.config.get("window_size", 100))
+        self._min_samples = int(self.config.get("min_samples", 20))
+        self._branch_mispredict_threshold = float(self.config.get("branch_mispredict_threshold", 0.15))
+        # Smallest sample count any detector accepts (memory analysis needs 10)
+        self._warmup_samples = min(self._min_samples, 10)
+        self._warmed_up = False
+        
+        # metrics_config.json has no spectre_metrics section; use the default set then
+        spectre_metrics = (self.config.get("spectre_metrics")
+                           or self.get_default_spectre_config()["spectre_metrics"])
+        for metric_name, config in spectre_metrics.items():
             if metric_name not in self.performance_windows:
-                self.performance_windows[metric_name] = deque(maxlen=self.config.get("window_size", 100))
+                self.performance_windows[metric_name] = RingBuffer(self._window_size)
+        
+        # Column order expected by add_performance_counters_batch
+        self.metric_order = tuple(spectre_metrics.keys())
+        self._ordered_windows = [self.performance_windows[name] for name in self.metric_order]
     
-    def add_performance_counter(self, metric_name: str, value: float, timestamp: Optional[datetime] = None) -> None:
-        """Add a new performance counter value."""
+    def add_performance_counter(self, metric_name: str, value: float, timestamp: Optional[int] = None) -> None:
+        """Add a new performance counter value (timestamp in time.monotonic_ns())."""
         if timestamp is None:
-            timestamp = datetime.now()
+            timestamp = time.monotonic_ns()
             
         if metric_name not in self.performance_windows:
-            self.performance_windows[metric_name] = deque(maxlen=self.config.get("window_size", 100))
+            self.performance_windows[metric_name] = RingBuffer(self._window_size)
             
-        self.performance_windows[metric_name].append({
-            "value": value,
-            "timestamp": timestamp
-        })
+        self.performance_windows[metric_name].push(value, timestamp)
+    
+    def add_performance_counters_batch(self, values: np.ndarray, timestamps: Optional[np.ndarray] = None) -> None:
+        """
+        Add many samples at once.
+        
+        Args:
+            values: (samples, metrics) array with columns in self.metric_order
+            timestamps: time.monotonic_ns() stamp per row; defaults to now for all rows
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if values.ndim != 2 or values.shape[1] == 0 or values.shape[1] != len(self.metric_order):
+            raise ValueError(f"Expected (samples, {len(self.metric_order)}) array, got {values.shape}")
+        
+        if timestamps is None:
+            timestamps = np.full(values.shape[0], time.monotonic_ns(), dtype=np.int64)
+            
+        for i, window in enumerate(self._ordered_windows):
+            window.push_many(values[:, i], timestamps)
+    
+    def _warming_up(self) -> bool:
+        """Return True while no detector has enough samples to run."""
+        if self._warmed_up:
+            return False
+        counts = [len(self.performance_windows[name]) for name in self.DETECTOR_METRICS
+                  if name in self.performance_windows]
+        # Windows only ever grow, so once warmed up this stays settled
+        self._warmed_up = bool(counts) and max(counts) >= self._warmup_samples
+        return not self._warmed_up
+    
+    def get_metric_view(self, metric_name: str) -> np.ndarray:
+        """Return the buffered samples of a metric, oldest first (a view unless wrapped)."""
+        if metric_name not in self.performance_windows:
+            return np.empty(0, dtype=np.float64)
+        return self.performance_windows[metric_name].recent()
+    
+    def to_datetime(self, monotonic_ns: int) -> datetime:
+        """Convert a time.monotonic_ns() stamp to local wall-clock time."""
+        return datetime.fromtimestamp((self._epoch_ns + (monotonic_ns - self._mono_epoch_ns)) / 1e9)
     
     def calculate_cache_timing_variance(self, metric_name: str = "cache_misses") -> Tuple[bool, float]:
         """Detect unusual cache timing patterns indicative of Spectre attacks."""
@@ -88,29 +306,15 @@ class SpectreAnomalyDetector:
             return False, 0.0
             
         window = self.performance_windows[metric_name]
-        if len(window) < self.config.get("min_samples", 20):
+        if len(window) < self._min_samples:
             return False, 0.0
             
-        values = [item["value"] for item in window]
-        
-        # Calculate variance in cache access patterns
-        if len(values) < 2:
-            return False, 0.0
-            
-        mean = statistics.mean(values)
-        variance = statistics.variance(values)
-        std_dev = statistics.stdev(values)
-        
         # Spectre attacks often cause irregular cache access patterns
         # High variance combined with timing irregularities can indicate attack
-        baseline_variance = self.baseline_metrics.get(f"{metric_name}_variance", variance * 0.5)
-        
-        variance_ratio = variance / baseline_variance if baseline_variance > 0 else 1.0
+        baseline_variance = self._baseline_var.get(metric_name, -1.0)
+        is_anomaly, variance_ratio = cache_variance_kernel(window.mean, window.variance, baseline_variance)
         
-        # Threshold for variance anomaly (attacks cause 3x+ variance increase)
-        is_anomaly = variance_ratio > 3.0 and std_dev > mean * 0.3
-        
-        return is_anomaly, variance_ratio
+        return bool(is_anomaly), float(variance_ratio)
     
     def detect_branch_prediction_anomalies(self) -> Tuple[bool, float]:
         """Detect branch prediction anomalies characteristic of Spectre."""
@@ -121,30 +325,15 @@ class SpectreAnomalyDetector:
         misses_window = self.performance_windows["branch_misses"]
         instructions_window = self.performance_windows["branch_instructions"]
         
-        if (len(misses_window) < self.config.get("min_samples", 20) or 
-            len(instructions_window) < self.config.get("min_samples", 20)):
+        if (len(misses_window) < self._min_samples or 
+            len(instructions_window) < self._min_samples):
             return False, 0.0
         
-        # Calculate recent misprediction rate
-        recent_misses = [item["value"] for item in list(misses_window)[-10:]]
-        recent_instructions = [item["value"] for item in list(instructions_window)[-10:]]
-        
-        if len(recent_misses) == 0 or len(recent_instructions) == 0:
-            return False, 0.0
-            
-        avg_misses = statistics.mean(recent_misses)
-        avg_instructions = statistics.mean(recent_instructions)
-        
-        if avg_instructions == 0:
-            return False, 0.0
-            
-        misprediction_rate = avg_misses / avg_instructions
-        threshold = self.config.get("branch_mispredict_threshold", 0.15)
-        
         # Spectre attacks often cause elevated branch mispredictions
-        is_anomaly = misprediction_rate > threshold
+        is_anomaly, misprediction_rate = branch_kernel(
+            misses_window.recent(10), instructions_window.recent(10), self._branch_mispredict_threshold)
         
-        return is_anomaly, misprediction_rate
+        return bool(is_anomaly), float(misprediction_rate)
     
     def detect_memory_access_patterns(self) -> Tuple[bool, float]:
         """Detect unusual memory access patterns that may indicate Spectre."""
@@ -154,33 +343,23 @@ class SpectreAnomalyDetector:
             if metric not in self.performance_windows:
                 return False, 0.0
         
-        # Analyze memory access patterns
-        loads = [item["value"] for item in list(self.performance_windows["mem_loads"])[-20:]]
-        stores = [item["value"] for item in list(self.performance_windows["mem_stores"])[-20:]]
-        llc_misses = [item["value"] for item in list(self.performance_windows["llc_misses"])[-20:]]
-        
-        if len(loads) < 10 or len(stores) < 10 or len(llc_misses) < 10:
+        windows = [self.performance_windows[metric] for metric in required_metrics]
+        n = min(min(len(window) for window in windows), self._mem_stack.shape[1])
+        if n < 10:
             return False, 0.0
         
-        # Calculate ratios that may indicate speculative execution abuse
-        avg_loads = statistics.mean(loads)
-        avg_stores = statistics.mean(stores)
-        avg_llc_misses = statistics.mean(llc_misses)
-        
-        # Spectre attacks often show high load/store ratio and elevated LLC misses
-        load_store_ratio = avg_loads / avg_stores if avg_stores > 0 else 0
-        llc_miss_rate = avg_llc_misses / avg_loads if avg_loads > 0 else 0
+        # Analyze memory access patterns: average all three series in one pass
+        stack = self._mem_stack[:, :n]
+        for row, window in zip(stack, windows):
+            np.copyto(row, window.recent(n))
+        avg_loads, avg_stores, avg_llc_misses = stack.mean(axis=1).tolist()
         
-        # Thresholds based on typical Spectre attack patterns
-        suspicious_load_ratio = load_store_ratio > 5.0  # Much more loads than stores
-        high_llc_miss_rate = llc_miss_rate > 0.1  # >10% LLC miss rate
+        # Ratios that may indicate speculative execution abuse
+        is_anomaly, confidence = memory_kernel(avg_loads, avg_stores, avg_llc_misses)
         
-        is_anomaly = suspicious_load_ratio and high_llc_miss_rate
-        confidence = (load_store_ratio / 10.0) + (llc_miss_rate * 10.0)
-        
-        return is_anomaly, min(confidence, 1.0)
+        return bool(is_anomaly), float(confidence)
     
-    def detect_spectre_signature(self, performance_counters: Dict[str, float]) -> Dict[str, Any]:
+    def detect_spectre_signature(self, performance_counters: Dict[str, float]) -> "DetectionResult":
         """
         Main Spectre detection function using multiple indicators.
         
@@ -188,132 +367,107 @@ class SpectreAnomalyDetector:
             performance_counters: Dictionary of current performance counter values
             
         Returns:
-            Dictionary with detection results
+            DetectionResult; call to_dict() for the JSON-compatible form
         """
-        timestamp = datetime.now()
+        timestamp = time.monotonic_ns()
         
         # Add all performance counters
         for metric_name, value in performance_counters.items():
             self.add_performance_counter(metric_name, value, timestamp)
         
-        results = {
-            "timestamp": timestamp.isoformat(),
-            "performance_counters": performance_counters,
-            "spectre_indicators": {},
-            "overall_spectre_risk": False,
-            "risk_score": 0.0,
-            "attack_type": None
-        }
+        result = DetectionResult(timestamp_ns=timestamp, performance_counters=performance_counters)
+        
+        if self._warming_up():
+            # Every detector would bail out on its sample-count check
+            return result
         
         total_score = 0.0
-        indicator_count = 0
         
         # Check cache timing anomalies
-        try:
-            cache_anomaly, cache_score = self.calculate_cache_timing_variance("cache_misses")
-            results["spectre_indicators"]["cache_timing"] = {
-                "anomaly": cache_anomaly,
-                "score": cache_score
-            }
-            if cache_anomaly:
-                total_score += cache_score
-            indicator_count += 1
-        except Exception as e:
-            logger.error(f"Error in cache timing analysis: {e}")
+        result.cache_anomaly, result.cache_score = self.calculate_cache_timing_variance("cache_misses")
+        if result.cache_anomaly:
+            total_score += result.cache_score
         
         # Check branch prediction anomalies
-        try:
-            branch_anomaly, branch_score = self.detect_branch_prediction_anomalies()
-            results["spectre_indicators"]["branch_prediction"] = {
-                "anomaly": branch_anomaly,
-                "score": branch_score
-            }
-            if branch_anomaly:
-                total_score += min(branch_score * 10, 1.0)  # Normalize score
-            indicator_count += 1
-        except Exception as e:
-            logger.error(f"Error in branch prediction analysis: {e}")
+        result.branch_anomaly, result.branch_score = self.detect_branch_prediction_anomalies()
+        if result.branch_anomaly:
+            total_score += min(result.branch_score * 10, 1.0)  # Normalize score
         
         # Check memory access patterns
-        try:
-            memory_anomaly, memory_score = self.detect_memory_access_patterns()
-            results["spectre_indicators"]["memory_access"] = {
-                "anomaly": memory_anomaly,
-                "score": memory_score
-            }
-            if memory_anomaly:
-                total_score += memory_score
-            indicator_count += 1
-        except Exception as e:
-            logger.error(f"Error in memory access analysis: {e}")
+        result.mem_anomaly, result.mem_score = self.detect_memory_access_patterns()
+        if result.mem_anomaly:
+            total_score += result.mem_score
         
         # Calculate overall risk
-        if indicator_count > 0:
-            results["risk_score"] = total_score / indicator_count
-            
-            # Determine if this looks like a Spectre attack
-            anomaly_count = sum(1 for indicator in results["spectre_indicators"].values() 
-                              if indicator.get("anomaly", False))
-            
-            results["overall_spectre_risk"] = (
-                anomaly_count >= 2 or  # Multiple indicators
-                results["risk_score"] > 0.7  # High confidence single indicator
-            )
-            
-            # Classify potential attack type
-            if results["overall_spectre_risk"]:
-                if (results["spectre_indicators"].get("branch_prediction", {}).get("anomaly", False) and
-                    results["spectre_indicators"].get("cache_timing", {}).get("anomaly", False)):
-                    results["attack_type"] = "Spectre-v1 (Bounds Check Bypass)"
-                elif results["spectre_indicators"].get("branch_prediction", {}).get("anomaly", False):
-                    results["attack_type"] = "Spectre-v2 (Branch Target Injection)"
-                else:
-                    results["attack_type"] = "Spectre-variant (Unknown)"
+        result.risk_score = total_score / 3
+        
+        # Determine if this looks like a Spectre attack
+        anomaly_count = result.cache_anomaly + result.branch_anomaly + result.mem_anomaly
         
-        # Log potential attack
-        if results["overall_spectre_risk"]:
-            self.log_spectre_detection(results)
+        result.overall_risk = (
+            anomaly_count >= 2 or  # Multiple indicators
+            result.risk_score > 0.7  # High confidence single indicator
+        )
+        
+        # Classify potential attack type
+        if result.overall_risk:
+            if result.branch_anomaly and result.cache_anomaly:
+                result.attack_type = "Spectre-v1 (Bounds Check Bypass)"
+            elif result.branch_anomaly:
+                result.attack_type = "Spectre-v2 (Branch Target Injection)"
+            else:
+                result.attack_type = "Spectre-variant (Unknown)"
             
-        return results
+            # Log potential attack
+            self.log_spectre_detection(result)
+            
+        return result
     
-    def log_spectre_detection(self, detection_result: Dict[str, Any]) -> None:
+    def log_spectre_detection(self, detection_result: "DetectionResult") -> None:
         """Log potential Spectre attack detection."""
-        self.spectre_signatures.append(detection_result)
-        
+        detection_result.timestamp = self.to_datetime(detection_result.timestamp_ns).isoformat()
+        self._sig_buf[self._sig_head] = detection_result
+        self._sig_times_ns[self._sig_head] = detection_result.timestamp_ns
+        self._sig_head = (self._sig_head + 1) % len(self._sig_buf)
+        if self._sig_count < len(self._sig_buf):
+            self._sig_count += 1
+        
+        # One record for the detection and all anomalous indicators
+        indicators = [f"{indicator}:{result['score']:.2f}"
+                      for indicator, result in detection_result.indicators().items()
+                      if result["anomaly"]]
         logger.critical(
-            f"POTENTIAL SPECTRE ATTACK DETECTED - "
-            f"Risk Score: {detection_result['risk_score']:.2f}, "
-            f"Type: {detection_result.get('attack_type', 'Unknown')}"
+            "POTENTIAL SPECTRE ATTACK DETECTED - Risk Score: %.2f, Type: %s, Indicators: [%s]",
+            detection_result.risk_score,
+            detection_result.attack_type,
+            ",".join(indicators)
         )
-        
-        # Log specific indicators
-        for indicator, result in detection_result["spectre_indicators"].items():
-            if result.get("anomaly", False):
-                logger.warning(f"  {indicator}: anomaly detected (score: {result['score']:.2f})")
     
     def update_baseline(self, performance_counters: Dict[str, float]) -> None:
         """Update baseline metrics for normal system behavior."""
         for metric_name, value in performance_counters.items():
             if metric_name in self.performance_windows:
                 window = self.performance_windows[metric_name]
-                if len(window) >= self.config.get("min_samples", 20):
-                    values = [item["value"] for item in window]
-                    self.baseline_metrics[f"{metric_name}_mean"] = statistics.mean(values)
-                    self.baseline_metrics[f"{metric_name}_variance"] = statistics.variance(values)
+                if len(window) >= self._min_samples:
+                    self._baseline_mean[metric_name] = window.mean
+                    self._baseline_var[metric_name] = window.variance
                     
         logger.info("Baseline metrics updated")
     
     def get_spectre_history(self, hours: int = 24) -> List[Dict[str, Any]]:
         """Get history of Spectre detections."""
-        cutoff_time = datetime.now() - timedelta(hours=hours)
-        
-        history = []
-        for detection in self.spectre_signatures:
-            detection_time = datetime.fromisoformat(detection["timestamp"])
-            if detection_time >= cutoff_time:
-                history.append(detection)
-                
-        return history
+        cutoff_ns = time.monotonic_ns() - hours * 3600 * 10**9
+        
+        # Oldest first; detections are logged in time order
+        if self._sig_count < len(self._sig_buf):
+            signatures = self._sig_buf[:self._sig_count]
+            times_ns = self._sig_times_ns[:self._sig_count]
+        else:
+            signatures = self._sig_buf[self._sig_head:] + self._sig_buf[:self._sig_head]
+            times_ns = np.concatenate((self._sig_times_ns[self._sig_head:], self._sig_times_ns[:self._sig_head]))
+        
+        start = int(np.searchsorted(times_ns, cutoff_ns, side='left'))
+        return [detection.to_dict() for detection in signatures[start:]]
 
 def main():
     """Main function for testing Spectre detection."""
@@ -321,17 +475,20 @@ def main():
     enhanced_monitor = integrate_enhanced_monitoring()
     # Simulate normal system behavior
     print("Establishing baseline...")
-    for i in range(25):
-        normal_counters = {
-            "cache_misses": 5000 + np.random.normal(0, 500),
-            "cache_references": 25000 + np.random.normal(0, 2000),
-            "branch_misses": 2000 + np.random.normal(0, 200),
-            "branch_instructions": 50000 + np.random.normal(0, 3000),
-            "mem_loads": 10000 + np.random.normal(0, 1000),
-            "mem_stores": 8000 + np.random.normal(0, 800),
-            "llc_misses": 200 + np.random.normal(0, 50)
-        }
-        detector.update_baseline(normal_counters)
+    normal_profile = {  # mean, std dev
+        "cache_misses": (5000, 500),
+        "cache_references": (25000, 2000),
+        "branch_misses": (2000, 200),
+        "branch_instructions": (50000, 3000),
+        "mem_loads": (10000, 1000),
+        "mem_stores": (8000, 800),
+        "llc_misses": (200, 50)
+    }
+    # Ingest 25 samples of every configured metric as one batch
+    profile = np.array([normal_profile.get(name, (0, 0)) for name in detector.metric_order]).reshape(-1, 2)
+    normal_batch = profile[:, 0] + np.random.normal(0, 1, (25, len(profile))) * profile[:, 1]
+    detector.add_performance_counters_batch(normal_batch)
+    detector.update_baseline(dict(zip(detector.metric_order, normal_batch[-1])))
     
     # Simulate potential Spectre attack
     print("\nTesting with suspicious performance counters...")
@@ -345,15 +502,19 @@ def main():
         "llc_misses": 1500    # High LLC misses
     }
     
-    result = detector.detect_spectre_signature(suspicious_counters)
+    result = None
+    with detection_guard():
+        result = detector.detect_spectre_signature(suspicious_counters)
+    if result is None:
+        return
     
     print("Detection Results:")
-    print(f"Overall Spectre Risk: {result['overall_spectre_risk']}")
-    print(f"Risk Score: {result['risk_score']:.2f}")
-    print(f"Potential Attack Type: {result.get('attack_type', 'None')}")
+    print(f"Overall Spectre Risk: {result.overall_risk}")
+    print(f"Risk Score: {result.risk_score:.2f}")
+    print(f"Potential Attack Type: {result.attack_type}")
     
     print("\nDetailed Indicators:")
-    for indicator, details in result["spectre_indicators"].items():
+    for indicator, details in result.indicators().items():
         print(f"  {indicator}: {'ANOMALY' if details['anomaly'] else 'NORMAL'} (score: {details['score']:.2f})")
 
 if __name__ == "__main__":
@@ -5,9 +5,13 @@ Calculates baseline values for various system performance metrics.
 """
 
 import json
-import statistics
 import logging
-from typing import Dict, List, Any, Optional
+import numpy as np
+try:
+    import orjson
+except ImportError:
+    orjson = None
+from typing import Dict, List, Any, Optional, Sequence, Union
 from datetime import datetime, timedelta
 
 logging.basicConfig(level=logging.INFO)
@@ -18,12 +22,14 @@ class BaselineCalculator:
         """Initialize baseline calculator with configuration."""
         self.config = self.load_config(config_file)
         self.baselines = {}
+        self._min_samples = int(self.config.get("min_samples", 10))
         
     def load_config(self, config_file: str) -> Dict[str, Any]:
         """Load configuration from JSON file."""
         try:
-            with open(config_file, 'r') as f:
-                return json.load(f)
+            with open(config_file, 'rb') as f:
+                data = f.read()
+            return orjson.loads(data) if orjson else json.loads(data)
         except FileNotFoundError:
             logger.warning(f"Config file {config_file} not found, using defaults")
             return self.get_default_config()
@@ -45,20 +51,25 @@ class BaselineCalculator:
             }
         }
     
-    def calculate_baseline(self, metric_name: str, values: List[float]) -> Dict[str, float]:
-        """Calculate baseline statistics for a metric."""
-        if len(values) < self.config.get("min_samples", 10):
+    def calculate_baseline(self, metric_name: str, values: Union[np.ndarray, List[float]]) -> Dict[str, float]:
+        """Calculate baseline statistics for a metric (float64 arrays are used without copying)."""
+        if len(values) < self._min_samples:
             logger.warning(f"Insufficient samples for {metric_name}: {len(values)}")
             return {}
         
+        arr = np.asarray(values, dtype=np.float64)
+        # Sort once; quantiles and min/max are all read from the same array
+        sorted_arr = np.sort(arr)
+        median, p95, p99 = np.quantile(sorted_arr, [0.5, 0.95, 0.99], method='linear').tolist()
+        
         baseline = {
-            "mean": statistics.mean(values),
-            "median": statistics.median(values),
-            "std_dev": statistics.stdev(values) if len(values) > 1 else 0.0,
-            "min": min(values),
-            "max": max(values),
-            "p95": self.percentile(values, 95),
-            "p99": self.percentile(values, 99),
+            "mean": float(arr.mean()),
+            "median": median,
+            "std_dev": float(arr.std(ddof=1)) if len(arr) > 1 else 0.0,
+            "min": float(sorted_arr[0]),
+            "max": float(sorted_arr[-1]),
+            "p95": p95,
+            "p99": p99,
             "sample_count": len(values)
         }
         
@@ -67,25 +78,33 @@ class BaselineCalculator:
         
         return baseline
     
-    def percentile(self, values: List[float], percentile: float) -> float:
-        """Calculate percentile value."""
-        sorted_values = sorted(values)
-        k = (len(sorted_values) - 1) * percentile / 100
-        f = int(k)
-        c = k - f
-        if f == len(sorted_values) - 1:
-            return sorted_values[f]
-        return sorted_values[f] * (1 - c) + sorted_values[f + 1] * c
+    def percentile(self, values: List[float],
+                   percentile: Union[float, Sequence[float]]) -> Union[float, List[float]]:
+        """Calculate one or several percentile values (linear interpolation) with a single sort."""
+        result = np.percentile(np.asarray(values, dtype=np.float64), percentile, method='linear')
+        return result.tolist() if result.ndim else float(result)
     
-    def update_baselines(self, metrics_data: Dict[str, List[float]]) -> None:
+    def update_baselines(self, metrics_data: Dict[str, Union[np.ndarray, List[float]]]) -> None:
         """Update baselines with new metrics data."""
+        updated_at = datetime.now().isoformat()
+        summary = []
         for metric_name, values in metrics_data.items():
-            if values:
+            if len(values):
                 baseline = self.calculate_baseline(metric_name, values)
                 if baseline:
                     self.baselines[metric_name] = baseline
-                    self.baselines[metric_name]["updated_at"] = datetime.now().isoformat()
-                    logger.info(f"Updated baseline for {metric_name}: mean={baseline['mean']:.2f}")
+                    self.baselines[metric_name]["updated_at"] = updated_at
+                    summary.append(f"{metric_name}(mean={baseline['mean']:.2f})")
+        
+        if summary:
+            logger.info("Updated baselines: %s", ", ".join(summary))
+    
+    def update_baselines_from_detector(self, detector) -> None:
+        """Update baselines directly from a SpectreAnomalyDetector's sample windows."""
+        self.update_baselines({
+            metric_name: detector.get_metric_view(metric_name)
+            for metric_name in detector.performance_windows
+        })
     
     def is_anomaly(self, metric_name: str, value: float) -> bool:
         """Check if a value is an anomaly based on baseline."""
@@ -109,8 +128,12 @@ class BaselineCalculator:
     def save_baselines(self, filename: str = "baselines.json") -> None:
         """Save baselines to file."""
         try:
-            with open(filename, 'w') as f:
-                json.dump(self.baselines, f, indent=2)
+            if orjson:
+                data = orjson.dumps(self.baselines, option=orjson.OPT_INDENT_2)
+            else:
+                data = json.dumps(self.baselines, indent=2).encode()
+            with open(filename, 'wb') as f:
+                f.write(data)
             logger.info(f"Baselines saved to {filename}")
         except Exception as e:
             logger.error(f"Error saving baselines: {e}")
@@ -118,8 +141,9 @@ class BaselineCalculator:
     def load_baselines(self, filename: str = "baselines.json") -> bool:
         """Load baselines from file."""
         try:
-            with open(filename, 'r') as f:
-                self.baselines = json.load(f)
+            with open(filename, 'rb') as f:
+                data = f.read()
+            self.baselines = orjson.loads(data) if orjson else json.loads(data)
             logger.info(f"Baselines loaded from {filename}")
             return True
         except FileNotFoundError:
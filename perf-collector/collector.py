@@ -2,22 +2,82 @@
 
 import os
 import sys
+import atexit
+import csv
+import io
 import time
 import json
 import subprocess
 import logging
 import threading
-from datetime import datetime
+import functools
+import math
+import queue
+import re
+from collections import deque
 from typing import Dict, List, Optional, Union
 import psutil
 import numpy as np
-from influxdb_client import InfluxDBClient, Point, WritePrecision
-from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client import InfluxDBClient, WritePrecision
+from influxdb_client.client.write_api import WriteOptions
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Consecutive empty ticks before the perf stream is abandoned for one-shot runs
+PERF_STREAM_MAX_MISSES = 3
+
+# Shortest gap between psutil.cpu_percent reads, in seconds
+CPU_PERCENT_MIN_INTERVAL = 0.1
+
+def ttl_cache(ttl: float):
+    """Memoize a zero-argument function's result for ttl seconds"""
+    def decorator(func):
+        cached_at = None
+        value = None
+
+        @functools.wraps(func)
+        def wrapper():
+            nonlocal cached_at, value
+            now = time.monotonic()
+            if cached_at is None or now - cached_at >= ttl:
+                value = func()
+                cached_at = now
+            return value
+        return wrapper
+    return decorator
+
+@ttl_cache(0.5)
+def virtual_memory():
+    return psutil.virtual_memory()
+
+@ttl_cache(0.5)
+def load_average():
+    return os.getloadavg()
+
+# Name tokens that identify each metric type, checked in this order
+METRIC_TYPE_KEYWORDS = (
+    ('cache', frozenset({'cache', 'dcache', 'icache', 'llc', 'l1', 'l1d', 'l1i', 'l2', 'l3', 'tlb', 'dtlb', 'itlb'})),
+    ('branch', frozenset({'branch', 'branches'})),
+    ('memory', frozenset({'mem', 'memory'})),
+    ('speculative', frozenset({'uops', 'machine', 'recovery'})),
+    ('system', frozenset({'cpu', 'load'})),
+)
+METRIC_NAME_SEPARATORS = re.compile(r'[^a-z0-9]+')
+
+# Characters that must be backslash-escaped in line-protocol tag keys/values
+LINE_PROTOCOL_TAG_ESCAPES = str.maketrans({',': r'\,', '=': r'\=', ' ': r'\ '})
+
+def escape_tag(value: str) -> str:
+    """Escape a tag value for InfluxDB line protocol"""
+    return value.translate(LINE_PROTOCOL_TAG_ESCAPES)
+
+# Keys returned by collect_system_metrics; everything else comes from perf
+SYSTEM_METRIC_NAMES = frozenset({
+    'cpu_percent', 'memory_percent', 'memory_available', 'load_1min', 'load_5min', 'load_15min'
+})
+
 class SpectreMetricsCollector:
     def __init__(self):
         self.influx_client = None
@@ -25,12 +85,26 @@ class SpectreMetricsCollector:
         self.setup_influxdb()
         self.load_config()
         self.baseline_data = {}
+        # Baseline mean/std per metric as contiguous arrays for detect_anomalies,
+        # indexed by _metric_index; unwarmed slots stay at mean 0 / std 1
+        self._metric_index = {}
+        self._means = np.zeros(64)
+        self._stds = np.ones(64)
         
         # Load settings from config
         self.collection_settings = self.get_collection_settings()
         self.anomaly_threshold = self.collection_settings.get('anomaly_threshold_std', 3.0)
         self.baseline_window = self.collection_settings.get('baseline_window', 1000)
         self.available_events = self.get_available_events()
+        self.perf_stream = None
+        self.perf_interval = 1.0
+        self.perf_stream_misses = 0
+        self.perf_samples = queue.Queue()
+
+        # Prime psutil's CPU counters so later non-blocking reads have a reference
+        psutil.cpu_percent(interval=None)
+        self.cpu_percent = 0.0
+        self.cpu_percent_time = time.monotonic()
 
     def setup_influxdb(self):
         """Initialize InfluxDB connection"""
@@ -39,13 +113,25 @@ class SpectreMetricsCollector:
             token = os.getenv('INFLUXDB_TOKEN', 'your-influxdb-token')
             org = os.getenv('INFLUXDB_ORG', 'spectre-monitoring')
 
-            self.influx_client = InfluxDBClient(url=url, token=token, org=org)
-            self.write_api = self.influx_client.write_api(write_options=SYNCHRONOUS)
+            self.influx_client = InfluxDBClient(url=url, token=token, org=org, enable_gzip=True)
+            # Batch writes in the background so the collection loop never blocks on the network
+            self.write_api = self.influx_client.write_api(write_options=WriteOptions(
+                batch_size=5000, flush_interval=1000, jitter_interval=200))
+            atexit.register(self.close_influxdb)
             logger.info("InfluxDB connection established")
         except Exception as e:
             logger.error(f"Failed to connect to InfluxDB: {e}")
             sys.exit(1)
 
+    def close_influxdb(self):
+        """Flush pending batched writes and close the InfluxDB connection"""
+        if self.write_api:
+            self.write_api.close()
+            self.write_api = None
+        if self.influx_client:
+            self.influx_client.close()
+            self.influx_client = None
+
     def get_collection_settings(self) -> Dict:
         """Extract collection settings from config"""
         try:
@@ -101,6 +187,14 @@ class SpectreMetricsCollector:
             # Use default config
             self.config = self.get_default_config()
 
+        # Every category is collected by one perf stat run; events listed in
+        # several categories are counted once
+        self.perf_events = sorted({
+            event
+            for events in self.config.values() if events and isinstance(events, list)
+            for event in events
+        })
+
     def flatten_config(self, config: Dict) -> Dict:
         """Flatten nested config structure to simple event lists"""
         flattened = {}
@@ -186,6 +280,7 @@ class SpectreMetricsCollector:
             # Build perf command
             cmd = [
                 'perf', 'stat',
+                '-a',  # System-wide, same scope as the perf stream
                 '-e', event_string,
                 '-x', ',',  # CSV output
                 '--', 'sleep', str(duration)
@@ -206,41 +301,109 @@ class SpectreMetricsCollector:
             logger.error(f"Error running perf command: {e}")
             return {}
 
-    def parse_perf_output(self, output: str) -> Dict:
-        """Parse perf stat CSV output"""
+    def start_perf_stream(self, interval: float):
+        """Start one long-running perf stat that prints counts every interval"""
+        events = self.filter_available_events(self.perf_events)
+        if not events:
+            logger.warning(f"No available events from list: {self.perf_events}")
+            return
+
+        cmd = [
+            'perf', 'stat',
+            '-a',  # System-wide; the sleep itself is idle and would count nothing
+            '-I', str(max(int(interval * 1000), 10)),  # perf's minimum is 10 ms
+            '-e', ','.join(events),
+            '-x', ',',  # CSV output
+            '--', 'sleep', 'infinity'
+        ]
+        try:
+            self.perf_stream = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                                text=True, bufsize=1)
+        except OSError as e:
+            logger.error(f"Failed to start perf stream: {e}")
+            return
+
+        self.perf_interval = interval
+        self.perf_stream_misses = 0
+        reader = threading.Thread(target=self.read_perf_stream, args=(self.perf_stream,),
+                                  name='perf-reader', daemon=True)
+        reader.start()
+        atexit.register(self.stop_perf_stream)
+        logger.info(f"Streaming {len(events)} perf events every {interval}s")
+
+    def stop_perf_stream(self):
+        """Terminate the perf stream process"""
+        if self.perf_stream and self.perf_stream.poll() is None:
+            self.perf_stream.terminate()
+            try:
+                self.perf_stream.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.perf_stream.kill()
+        self.perf_stream = None
+
+    def read_perf_stream(self, proc: subprocess.Popen):
+        """Reader thread: queue (event_name, value) for every interval row perf prints"""
+        # Format: time,value,unit,event_name,run_time,pct
+        for row in csv.reader(proc.stderr):
+            if len(row) < 4 or row[0].startswith('#'):
+                continue
+
+            # Skip '<not supported>', '<not counted>' and empty values
+            value_str = row[1]
+            if not value_str or value_str[0] == '<':
+                continue
+            try:
+                self.perf_samples.put((row[3].strip(), float(value_str)))
+            except ValueError as e:
+                logger.debug(f"Failed to parse row: {row}, error: {e}")
+
+        logger.warning(f"perf stream exited with code {proc.wait()}")
+
+    def drain_perf_samples(self, timeout: float) -> Dict[str, float]:
+        """Collect the newest streamed value of each event, waiting up to timeout for the first"""
+        metrics = {}
+        try:
+            name, value = self.perf_samples.get(timeout=timeout)
+            metrics[name] = value
+            while True:
+                name, value = self.perf_samples.get_nowait()
+                metrics[name] = value
+        except queue.Empty:
+            pass
+        return metrics
+
+    def parse_perf_output(self, output: str) -> Dict[str, float]:
+        """Parse perf stat CSV output into {event_name: value}"""
         metrics = {}
-        lines = output.strip().split('\n')
 
-        for line in lines:
-            if not line or line.startswith('#'):
+        # Format: value,unit,event_name,time,pct
+        for row in csv.reader(io.StringIO(output)):
+            if len(row) < 3 or row[0].startswith('#'):
                 continue
 
-            parts = line.split(',')
-            if len(parts) >= 3:
-                try:
-                    # Format: value,unit,event_name,time,pct
-                    value_str = parts[0].strip()
-                    event_name = parts[2].strip()
-
-                    # Handle 'not supported' or empty values
-                    if value_str and value_str != '<not supported>' and value_str != '<not counted>':
-                        value = float(value_str)
-                        metrics[event_name] = {
-                            'value': value,
-                            'timestamp': datetime.utcnow().isoformat()
-                        }
-                except (ValueError, IndexError) as e:
-                    logger.debug(f"Failed to parse line: {line}, error: {e}")
-                    continue
+            # Skip '<not supported>', '<not counted>' and empty values
+            value_str = row[0]
+            if not value_str or value_str[0] == '<':
+                continue
+            try:
+                metrics[row[2].strip()] = float(value_str)
+            except ValueError as e:
+                logger.debug(f"Failed to parse row: {row}, error: {e}")
 
         return metrics
 
     def collect_system_metrics(self) -> Dict:
         """Collect additional system metrics"""
         try:
-            cpu_percent = psutil.cpu_percent(interval=0.1)
-            memory = psutil.virtual_memory()
-            load_avg = os.getloadavg()
+            # Non-blocking: utilization since the previous read. Reads closer together
+            # than CPU_PERCENT_MIN_INTERVAL are too noisy, so reuse the last value.
+            now = time.monotonic()
+            if now - self.cpu_percent_time >= CPU_PERCENT_MIN_INTERVAL:
+                self.cpu_percent = psutil.cpu_percent(interval=None)
+                self.cpu_percent_time = now
+            cpu_percent = self.cpu_percent
+            memory = virtual_memory()
+            load_avg = load_average()
 
             return {
                 'cpu_percent': cpu_percent,
@@ -258,133 +421,161 @@ class SpectreMetricsCollector:
         """Detect anomalies in current metrics"""
         anomalies = []
 
-        for metric_name, metric_data in current_metrics.items():
-            if metric_name not in self.baseline_data:
-                continue
-
-            # Handle both dict and numeric values
-            if isinstance(metric_data, dict):
-                current_value = metric_data.get('value', 0)
-            else:
-                current_value = float(metric_data)
-
-            baseline = self.baseline_data[metric_name]
-            mean = baseline.get('mean', 0)
-            std = baseline.get('std', 1)
-
-            if std > 0:
-                z_score = abs((current_value - mean) / std)
-                if z_score > self.anomaly_threshold:
-                    high_threshold = self.collection_settings.get('high_severity_threshold_std', 5.0)
-                    anomalies.append({
-                        'metric': metric_name,
-                        'current_value': current_value,
-                        'baseline_mean': mean,
-                        'z_score': z_score,
-                        'severity': 'high' if z_score > high_threshold else 'medium'
-                    })
+        names = [name for name in current_metrics if name in self._metric_index]
+        if not names:
+            return anomalies
+
+        # Z-scores for every metric in one vectorized pass
+        idx = np.fromiter((self._metric_index[name] for name in names), dtype=np.intp, count=len(names))
+        current = np.fromiter((current_metrics[name] for name in names), dtype=np.float64, count=len(names))
+        means = self._means[idx]
+        stds = self._stds[idx]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z_scores = np.abs((current - means) / stds)
+        mask = (stds > 0) & (z_scores > self.anomaly_threshold)
+
+        high_threshold = self.collection_settings.get('high_severity_threshold_std', 5.0)
+        for i in np.flatnonzero(mask):
+            z_score = float(z_scores[i])
+            anomalies.append({
+                'metric': names[i],
+                'current_value': current_metrics[names[i]],
+                'baseline_mean': float(means[i]),
+                'z_score': z_score,
+                'severity': 'high' if z_score > high_threshold else 'medium'
+            })
 
         return anomalies
 
+    def _metric_slot(self, metric_name: str) -> int:
+        """Assign a metric its index in the baseline arrays, growing them as needed"""
+        index = len(self._metric_index)
+        if index == len(self._means):
+            self._means = np.concatenate((self._means, np.zeros(index)))
+            self._stds = np.concatenate((self._stds, np.ones(index)))
+        self._metric_index[metric_name] = index
+        return index
+
     def update_baseline(self, metrics: Dict):
         """Update baseline statistics for metrics"""
-        for metric_name, metric_data in metrics.items():
-            # Handle both dict and numeric values
-            if isinstance(metric_data, dict):
-                value = metric_data.get('value', 0)
-            else:
-                value = float(metric_data)
-
+        for metric_name, value in metrics.items():
             if metric_name not in self.baseline_data:
                 self.baseline_data[metric_name] = {
-                    'values': [],
+                    'values': deque(maxlen=self.baseline_window),
+                    'sum': 0.0,
+                    'sum_sq': 0.0,
+                    'updates': 0,
+                    'index': self._metric_slot(metric_name),
                     'mean': 0,
                     'std': 1
                 }
 
             baseline = self.baseline_data[metric_name]
-            baseline['values'].append(value)
-
-            # Keep only configured number of values for baseline
-            if len(baseline['values']) > self.baseline_window:
-                baseline['values'] = baseline['values'][-self.baseline_window:]
+            values = baseline['values']
+
+            # Running sums over the window; the deque drops the oldest value once full
+            if len(values) == values.maxlen:
+                oldest = values[0]
+                baseline['sum'] -= oldest
+                baseline['sum_sq'] -= oldest * oldest
+            values.append(value)
+            baseline['sum'] += value
+            baseline['sum_sq'] += value * value
+
+            # Recompute the sums exactly once per window to cancel floating-point drift
+            baseline['updates'] += 1
+            if baseline['updates'] % self.baseline_window == 0:
+                baseline['sum'] = math.fsum(values)
+                baseline['sum_sq'] = math.fsum(v * v for v in values)
 
             # Update statistics if we have enough data
-            if len(baseline['values']) >= 10:
-                baseline['mean'] = np.mean(baseline['values'])
-                baseline['std'] = max(np.std(baseline['values']), 0.1)  # Minimum std
+            n = len(values)
+            if n >= 10:
+                mean = baseline['sum'] / n
+                std = math.sqrt(max(baseline['sum_sq'] / n - mean * mean, 0.01))  # Minimum std 0.1
+                baseline['mean'] = mean
+                baseline['std'] = std
+                self._means[baseline['index']] = mean
+                self._stds[baseline['index']] = std
 
     def write_to_influxdb(self, metrics: Dict, anomalies: List[Dict]):
         """Write metrics and anomalies to InfluxDB"""
         try:
-            points = []
-            timestamp = datetime.utcnow()
-
-            # Write performance metrics
-            for metric_name, metric_data in metrics.items():
-                if isinstance(metric_data, dict) and 'value' in metric_data:
-                    point = Point("spectre_metrics") \
-                        .tag("metric_type", self.get_metric_type(metric_name)) \
-                        .tag("metric_name", metric_name) \
-                        .field("value", float(metric_data['value'])) \
-                        .time(timestamp, WritePrecision.S)
-                    points.append(point)
-                elif isinstance(metric_data, (int, float)):
-                    point = Point("system_metrics") \
-                        .tag("metric_name", metric_name) \
-                        .field("value", float(metric_data)) \
-                        .time(timestamp, WritePrecision.S)
-                    points.append(point)
+            # Build line protocol directly rather than a Point object per metric
+            lines = []
+            timestamp = int(time.time())
+
+            # Write perf and system metrics
+            for metric_name, value in metrics.items():
+                value = float(value)
+                if math.isfinite(value):  # line protocol has no NaN/inf
+                    lines.append(f"{self.line_protocol_prefix(metric_name)} value={value!r} {timestamp}")
 
             # Write anomalies
             for anomaly in anomalies:
-                point = Point("spectre_anomalies") \
-                    .tag("metric", anomaly['metric']) \
-                    .tag("severity", anomaly['severity']) \
-                    .field("current_value", anomaly['current_value']) \
-                    .field("baseline_mean", anomaly['baseline_mean']) \
-                    .field("z_score", anomaly['z_score']) \
-                    .time(timestamp, WritePrecision.S)
-                points.append(point)
-
-            if points:
+                lines.append(
+                    f"spectre_anomalies,metric={escape_tag(anomaly['metric'])},severity={anomaly['severity']} "
+                    f"current_value={float(anomaly['current_value'])!r},"
+                    f"baseline_mean={float(anomaly['baseline_mean'])!r},"
+                    f"z_score={float(anomaly['z_score'])!r} {timestamp}"
+                )
+
+            if lines:
                 bucket = os.getenv('INFLUXDB_BUCKET', 'spectre-metrics')
-                self.write_api.write(bucket=bucket, record=points)
-                logger.info(f"Written {len(points)} points to InfluxDB")
+                self.write_api.write(bucket=bucket, record=lines, write_precision=WritePrecision.S)
+                logger.info(f"Queued {len(lines)} points for InfluxDB")
 
         except Exception as e:
             logger.error(f"Error writing to InfluxDB: {e}")
 
-    def get_metric_type(self, metric_name: str) -> str:
-        """Categorize metric by type"""
-        name_lower = metric_name.lower()
-        if any(cache_metric in name_lower for cache_metric in ['cache', 'llc', 'l1', 'l2', 'l3', 'tlb']):
-            return 'cache'
-        elif any(branch_metric in name_lower for branch_metric in ['branch']):
-            return 'branch'
-        elif any(mem_metric in name_lower for mem_metric in ['mem_', 'memory']):
-            return 'memory'
-        elif any(spec_metric in name_lower for spec_metric in ['uops', 'machine_clear', 'recovery']):
-            return 'speculative'
-        elif any(sys_metric in name_lower for sys_metric in ['cpu', 'load', 'memory_percent']):
-            return 'system'
-        else:
-            return 'execution'
+    @classmethod
+    @functools.lru_cache(maxsize=512)
+    def line_protocol_prefix(cls, metric_name: str) -> str:
+        """Measurement and tag set for a metric's line-protocol record (memoized per name)"""
+        if metric_name in SYSTEM_METRIC_NAMES:
+            return f"system_metrics,metric_name={escape_tag(metric_name)}"
+        return (f"spectre_metrics,metric_type={cls.get_metric_type(metric_name)},"
+                f"metric_name={escape_tag(metric_name)}")
+
+    @staticmethod
+    @functools.lru_cache(maxsize=512)
+    def get_metric_type(metric_name: str) -> str:
+        """Categorize metric by type (memoized: the set of metric names is small and fixed)"""
+        tokens = set(METRIC_NAME_SEPARATORS.split(metric_name.casefold()))
+        for metric_type, keywords in METRIC_TYPE_KEYWORDS:
+            if not tokens.isdisjoint(keywords):
+                return metric_type
+        return 'execution'
 
     def collect_all_metrics(self):
         """Collect all configured metrics"""
         all_metrics = {}
 
-        # Collect each category of metrics
-        for category, events in self.config.items():
-            if events and isinstance(events, list):
-                logger.info(f"Collecting {category}: {len(events)} events")
-                category_metrics = self.run_perf_command(events)
-                if category_metrics:
-                    all_metrics.update(category_metrics)
-                    logger.info(f"Got {len(category_metrics)} metrics from {category}")
+        # One perf stat run for every category, perf multiplexes if the events
+        # exceed the hardware counters. The persistent stream keeps the counters
+        # open; a one-shot run is the fallback whenever it yields nothing.
+        all_events = self.perf_events
+        if all_events:
+            logger.info(f"Collecting {len(all_events)} events from {len(self.config)} categories")
+            perf_metrics = {}
+            if self.perf_stream and self.perf_stream.poll() is None:
+                # Wait about one interval; a row is due by then
+                perf_metrics = self.drain_perf_samples(timeout=self.perf_interval)
+                if perf_metrics:
+                    self.perf_stream_misses = 0
                 else:
-                    logger.warning(f"No metrics collected from {category}")
+                    self.perf_stream_misses += 1
+                    if self.perf_stream_misses >= PERF_STREAM_MAX_MISSES:
+                        logger.warning(f"perf stream produced no counted rows for "
+                                       f"{self.perf_stream_misses} ticks, using one-shot perf runs")
+                        self.stop_perf_stream()
+            if not perf_metrics:
+                perf_metrics = self.run_perf_command(all_events)
+            if perf_metrics:
+                all_metrics.update(perf_metrics)
+                logger.info(f"Got {len(perf_metrics)} perf metrics")
+            else:
+                logger.warning("No perf metrics collected")
 
         # Add system metrics
         system_metrics = self.collect_system_metrics()
@@ -402,6 +593,7 @@ class SpectreMetricsCollector:
         # Use interval from config settings, fallback to env var, then default
         interval = self.collection_settings.get('sample_interval', 
                                                int(os.getenv('COLLECTION_INTERVAL', '1')))
+        self.start_perf_stream(interval)
 
         while True:
             try:
@@ -442,8 +634,8 @@ class SpectreMetricsCollector:
             time.sleep(interval)
 
         # Cleanup
-        if self.influx_client:
-            self.influx_client.close()
+        self.stop_perf_stream()
+        self.close_influxdb()
 
 if __name__ == "__main__":
     collector = SpectreMetricsCollector()
@@ -1,15 +1,28 @@
 # /home/specter-monitor/perf-collector/enhanced_cloud_monitor.py
 
+import asyncio
 import psutil
 import time
 import json
 import logging
+try:
+    import orjson
+except ImportError:
+    orjson = None
 import threading
+import queue
 from collections import defaultdict, deque
+from dataclasses import dataclass, field
 from datetime import datetime
 import subprocess
 import os
 
+@dataclass
+class CpuHistory:
+    """Per-process CPU samples plus a running sum of the newest 10"""
+    samples: deque = field(default_factory=lambda: deque(maxlen=60))
+    recent_sum: float = 0.0
+
 class EnhancedCloudSpectreMonitor:
     """
     Enhanced Spectre detection for cloud environments where hardware PMU access is limited.
@@ -21,158 +34,233 @@ class EnhancedCloudSpectreMonitor:
         self.logger = logging.getLogger(__name__)
         
         # Data structures for pattern analysis
-        self.cpu_usage_history = defaultdict(lambda: deque(maxlen=60))
-        self.memory_patterns = defaultdict(lambda: deque(maxlen=100))
+        self.cpu_usage_history = {}
+        self.memory_patterns = {}
         self.timing_anomalies = defaultdict(list)
-        self.process_creation_times = defaultdict(list)
+        self.process_creation_times = {}
+        self._creation_order = deque()  # (create_time, pid), oldest first
+        self._last_pids = set()  # pid snapshot from the previous process check
         
         # Thresholds (configurable)
         self.cpu_spike_threshold = self.config.get('cpu_spike_threshold', 3.0)
         self.memory_growth_threshold = self.config.get('memory_growth_mb', 100)
         self.rapid_process_threshold = self.config.get('rapid_process_count', 5)
+        self.pid_eviction_ticks = max(1, int(self.config.get('pid_eviction_ticks', 10)))  # 1 = every sweep
+        
+        # Alerts are queued by the monitors; one writer logs and persists them in batches
+        self.alert_file = '/data/spectre_alerts.json'
+        self.alert_queue_size = self.config.get('alert_queue_size', 10000)
+        self._alert_queue = queue.SimpleQueue()
+        self._dropped_alerts = 0
+        self._alert_fd = None
+        self._open_alert_file()
         
         # Monitoring flags
         self.running = False
         self.threads = []
     
     def start_monitoring(self):
-        """Start all monitoring threads"""
+        """Start the monitoring event loop in a background thread"""
         self.running = True
         
-        # Start monitoring threads
-        monitors = [
-            ('CPU Spike Monitor', self._monitor_cpu_spikes),
-            ('Memory Pattern Monitor', self._monitor_memory_patterns),
-            ('Process Behavior Monitor', self._monitor_process_behavior),
-            ('System Call Monitor', self._monitor_system_calls),
-            ('File Access Monitor', self._monitor_file_access),
-        ]
-        
-        for name, func in monitors:
-            thread = threading.Thread(target=func, name=name, daemon=True)
-            thread.start()
-            self.threads.append(thread)
-            self.logger.info(f"Started {name}")
+        # All monitors share one asyncio loop instead of a thread each
+        thread = threading.Thread(target=self._run_event_loop, name='Monitor Loop', daemon=True)
+        thread.start()
+        self.threads.append(thread)
     
     def stop_monitoring(self):
         """Stop all monitoring"""
         self.running = False
         self.logger.info("Stopping enhanced monitoring...")
+        
+        # Let the alert writer drain whatever is still queued
+        for thread in self.threads:
+            thread.join(timeout=2)
     
-    def _monitor_cpu_spikes(self):
-        """Monitor for sudden CPU usage spikes that might indicate side-channel attacks"""
-        while self.running:
-            try:
-                for proc in psutil.process_iter(['pid', 'name', 'cpu_percent']):
-                    try:
-                        pid = proc.info['pid']
-                        cpu = proc.info['cpu_percent']
-                        name = proc.info['name']
-                        
-                        # Track CPU usage history
-                        self.cpu_usage_history[pid].append(cpu)
-                        
-                        # Analyze for spikes
-                        if len(self.cpu_usage_history[pid]) > 10:
-                            recent_avg = sum(list(self.cpu_usage_history[pid])[-10:]) / 10
-                            
-                            # Detect sudden spikes
-                            if cpu > recent_avg * self.cpu_spike_threshold and cpu > 50:
-                                alert = {
-                                    'timestamp': datetime.now().isoformat(),
-                                    'alert_type': 'cpu_spike',
-                                    'pid': pid,
-                                    'process_name': name,
-                                    'cpu_percent': cpu,
-                                    'recent_average': recent_avg,
-                                    'severity': 'medium'
-                                }
-                                self._send_alert(alert)
-                                
-                    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                        continue
-                        
-            except Exception as e:
-                self.logger.error(f"CPU monitoring error: {e}")
-            
-            time.sleep(1)
+    def _run_event_loop(self):
+        """Run every monitor as a coroutine on a single event loop"""
+        try:
+            asyncio.run(self._run_monitors())
+        except Exception as e:
+            self.logger.error(f"Monitor loop error: {e}")
+    
+    async def _run_monitors(self):
+        # One-shot setup monitors
+        for name, func in [
+            ('System Call Monitor', self._monitor_system_calls),
+            ('File Access Monitor', self._monitor_file_access),
+        ]:
+            func()
+            self.logger.info(f"Started {name}")
+        
+        monitors = [
+            ('Process Monitor', self._monitor_all),
+            ('Alert Writer', self._write_alerts),
+        ]
+        tasks = []
+        for name, coro in monitors:
+            tasks.append(asyncio.create_task(coro(), name=name))
+            self.logger.info(f"Started {name}")
+        await asyncio.gather(*tasks)
     
-    def _monitor_memory_patterns(self):
-        """Monitor for unusual memory allocation patterns"""
+    async def _monitor_all(self):
+        """Sweep all processes once per second and feed the CPU, memory and process analyses"""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        tick = 0
         while self.running:
             try:
-                for proc in psutil.process_iter(['pid', 'name', 'memory_info']):
-                    try:
-                        pid = proc.info['pid']
-                        memory_mb = proc.info['memory_info'].rss / (1024 * 1024)
-                        name = proc.info['name']
-                        
-                        # Track memory usage
-                        self.memory_patterns[pid].append(memory_mb)
-                        
-                        # Detect rapid memory growth
-                        if len(self.memory_patterns[pid]) > 5:
-                            recent_growth = memory_mb - self.memory_patterns[pid][-6]
-                            
-                            if recent_growth > self.memory_growth_threshold:
-                                alert = {
-                                    'timestamp': datetime.now().isoformat(),
-                                    'alert_type': 'memory_anomaly',
-                                    'pid': pid,
-                                    'process_name': name,
-                                    'memory_growth_mb': recent_growth,
-                                    'current_memory_mb': memory_mb,
-                                    'severity': 'high' if recent_growth > 500 else 'medium'
-                                }
-                                self._send_alert(alert)
-                                
-                    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                        continue
+                # Memory patterns every 2s, process behavior every 5s, CPU every tick
+                check_memory = tick % 2 == 0
+                check_processes = tick % 5 == 0
+                evict_stale = tick % self.pid_eviction_ticks == 0
+                # One timestamp per sweep; alerts only need second resolution
+                now_iso = datetime.now().isoformat()
+                
+                # psutil reads /proc synchronously; keep them off the loop
+                await asyncio.to_thread(self._sweep_processes, check_memory, check_processes,
+                                        evict_stale, now_iso)
                         
             except Exception as e:
-                self.logger.error(f"Memory monitoring error: {e}")
+                self.logger.error(f"Process monitoring error: {e}")
             
-            time.sleep(2)
+            tick += 1
+            # Fixed one-second cadence; skip ahead rather than burst if a sweep overran
+            next_tick += 1
+            delay = next_tick - loop.time()
+            if delay < 0:
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
     
-    def _monitor_process_behavior(self):
-        """Monitor process creation patterns for suspicious behavior"""
-        while self.running:
+    def _sweep_processes(self, check_memory, check_processes, evict_stale, now_iso):
+        """Read every process once and run the per-process checks"""
+        seen_pids = set()
+        for proc in psutil.process_iter(['pid', 'name']):
             try:
-                current_time = time.time()
-                current_processes = set(p.pid for p in psutil.process_iter())
+                pid = proc.info['pid']
+                name = proc.info['name']
+                seen_pids.add(pid)
                 
-                # Track process creation timing
-                for pid in current_processes:
-                    if pid not in self.process_creation_times:
-                        self.process_creation_times[pid] = current_time
+                # Read /proc/<pid>/stat and friends once for all fields
+                with proc.oneshot():
+                    cpu = proc.cpu_percent()
+                    if check_memory:
+                        memory_mb = proc.memory_info().rss / (1024 * 1024)
                 
-                # Clean old entries
-                cutoff_time = current_time - 60  # Keep last 60 seconds
-                self.process_creation_times = {
-                    pid: create_time for pid, create_time in self.process_creation_times.items()
-                    if create_time > cutoff_time and pid in current_processes
+                self._check_cpu_spike(pid, name, cpu, now_iso)
+                if check_memory:
+                    self._check_memory_growth(pid, name, memory_mb, now_iso)
+                        
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+        
+        if evict_stale:
+            self._evict_stale_pids(seen_pids)
+        
+        if check_processes:
+            # One readdir of /proc, no Process objects
+            self._check_process_behavior(set(psutil.pids()), now_iso)
+    
+    def _evict_stale_pids(self, current_pids):
+        """Drop per-pid history for processes that have exited"""
+        for pid in self.cpu_usage_history.keys() - current_pids:
+            del self.cpu_usage_history[pid]
+        for pid in self.memory_patterns.keys() - current_pids:
+            del self.memory_patterns[pid]
+    
+    def _check_cpu_spike(self, pid, name, cpu, now_iso):
+        """Detect sudden CPU usage spikes that might indicate side-channel attacks"""
+        # Track CPU usage history, sliding the newest-10 sum in O(1)
+        history = self.cpu_usage_history.get(pid)
+        if history is None:
+            history = self.cpu_usage_history[pid] = CpuHistory()
+        samples = history.samples
+        if len(samples) >= 10:
+            history.recent_sum -= samples[-10]
+        history.recent_sum += cpu
+        samples.append(cpu)
+        
+        # Analyze for spikes
+        if len(samples) > 10:
+            recent_avg = history.recent_sum / 10
+            
+            # Detect sudden spikes
+            if cpu > recent_avg * self.cpu_spike_threshold and cpu > 50:
+                alert = {
+                    'timestamp': now_iso,
+                    'alert_type': 'cpu_spike',
+                    'pid': pid,
+                    'process_name': name,
+                    'cpu_percent': cpu,
+                    'recent_average': recent_avg,
+                    'severity': 'medium'
                 }
-                
-                # Check for rapid process creation (potential attack pattern)
-                recent_processes = [
-                    create_time for create_time in self.process_creation_times.values()
-                    if current_time - create_time < 10  # Last 10 seconds
-                ]
-                
-                if len(recent_processes) > self.rapid_process_threshold:
-                    alert = {
-                        'timestamp': datetime.now().isoformat(),
-                        'alert_type': 'rapid_process_creation',
-                        'process_count': len(recent_processes),
-                        'time_window': '10_seconds',
-                        'severity': 'high'
-                    }
-                    self._send_alert(alert)
-                    
-            except Exception as e:
-                self.logger.error(f"Process behavior monitoring error: {e}")
+                self._send_alert(alert)
+    
+    def _check_memory_growth(self, pid, name, memory_mb, now_iso):
+        """Detect unusual memory allocation patterns"""
+        # Track memory usage
+        pattern = self.memory_patterns.get(pid)
+        if pattern is None:
+            pattern = self.memory_patterns[pid] = deque(maxlen=100)
+        pattern.append(memory_mb)
+        
+        # Detect rapid memory growth
+        if len(pattern) > 5:
+            recent_growth = memory_mb - pattern[-6]
             
-            time.sleep(5)
+            if recent_growth > self.memory_growth_threshold:
+                alert = {
+                    'timestamp': now_iso,
+                    'alert_type': 'memory_anomaly',
+                    'pid': pid,
+                    'process_name': name,
+                    'memory_growth_mb': recent_growth,
+                    'current_memory_mb': memory_mb,
+                    'severity': 'high' if recent_growth > 500 else 'medium'
+                }
+                self._send_alert(alert)
+    
+    def _check_process_behavior(self, current_processes, now_iso):
+        """Check process creation patterns for suspicious behavior"""
+        current_time = time.time()
+        
+        # Track process creation timing. A pid absent from the previous snapshot
+        # is a new process even if a dead one with that pid is still tracked;
+        # its old deque entry no longer matches and is skipped on expiry.
+        for pid in current_processes:
+            if pid not in self._last_pids:
+                self.process_creation_times[pid] = current_time
+                self._creation_order.append((current_time, pid))
+        self._last_pids = current_processes
+        
+        # Expire entries from the old end only
+        cutoff_time = current_time - 60  # Keep last 60 seconds
+        creation_order = self._creation_order
+        while creation_order and creation_order[0][0] <= cutoff_time:
+            create_time, pid = creation_order.popleft()
+            if self.process_creation_times.get(pid) == create_time:
+                del self.process_creation_times[pid]
+        
+        # Check for rapid process creation (potential attack pattern)
+        recent_count = 0
+        for create_time, pid in reversed(creation_order):
+            if current_time - create_time >= 10:  # Last 10 seconds
+                break
+            # Skip dead pids and entries superseded by a reused pid
+            if pid in current_processes and self.process_creation_times.get(pid) == create_time:
+                recent_count += 1
+        
+        if recent_count > self.rapid_process_threshold:
+            alert = {
+                'timestamp': now_iso,
+                'alert_type': 'rapid_process_creation',
+                'process_count': recent_count,
+                'time_window': '10_seconds',
+                'severity': 'high'
+            }
+            self._send_alert(alert)
     
     def _monitor_system_calls(self):
         """Monitor system calls for timing anomalies (requires strace)"""
@@ -204,24 +292,67 @@ class EnhancedCloudSpectreMonitor:
             self.logger.error(f"File access monitoring error: {e}")
     
     def _send_alert(self, alert_data):
-        """Send alert to your existing alerting system"""
+        """Queue an alert for the alert writer; never blocks the monitors"""
+        if self._alert_queue.qsize() >= self.alert_queue_size:
+            self._dropped_alerts += 1
+        else:
+            self._alert_queue.put_nowait(alert_data)
+    
+    def _open_alert_file(self):
+        """(Re)open the alert file descriptor for appending, leaving it unset on failure"""
         try:
-            # Log the alert
-            self.logger.warning(f"SPECTRE ALERT: {alert_data}")
-            
-            # Here you would integrate with your existing InfluxDB/Prometheus alerting
-            # For now, we'll write to a file that your main collector can read
-            alert_file = '/data/spectre_alerts.json'
+            self._alert_fd = os.open(self.alert_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        except OSError as e:
+            self._alert_fd = None
+            self.logger.error(f"Failed to open alert file: {e}")
+    
+    def _close_alert_file(self):
+        try:
+            os.close(self._alert_fd)
+        except OSError:
+            pass
+        self._alert_fd = None
+    
+    async def _write_alerts(self):
+        """Log queued alerts and append them to the alert file with one write per 500 ms"""
+        while True:
+            stopping = not self.running
+            if not stopping:
+                await asyncio.sleep(0.5)
             
+            lines = []
             try:
-                with open(alert_file, 'a') as f:
-                    json.dump(alert_data, f)
-                    f.write('\n')
-            except Exception as e:
-                self.logger.error(f"Failed to write alert: {e}")
-                
-        except Exception as e:
-            self.logger.error(f"Alert sending failed: {e}")
+                while True:
+                    alert_data = self._alert_queue.get_nowait()
+                    self.logger.warning(f"SPECTRE ALERT: {alert_data}")
+                    
+                    # Here you would integrate with your existing InfluxDB/Prometheus alerting
+                    # For now, we'll write to a file that your main collector can read
+                    lines.append(orjson.dumps(alert_data) if orjson else json.dumps(alert_data).encode())
+            except queue.Empty:
+                pass
+            
+            if self._dropped_alerts:
+                self.logger.warning(f"Alert queue full, dropped {self._dropped_alerts} alerts")
+                self._dropped_alerts = 0
+            
+            if lines:
+                if self._alert_fd is None:
+                    self._open_alert_file()
+                if self._alert_fd is not None:
+                    buf = memoryview(b'\n'.join(lines) + b'\n')
+                    try:
+                        while buf:
+                            buf = buf[os.write(self._alert_fd, buf):]
+                    except OSError as e:
+                        self.logger.error(f"Failed to write alerts: {e}")
+                        self._close_alert_file()
+            
+            if stopping:
+                break
+        
+        if self._alert_fd is not None:
+            self._close_alert_file()
     
     def get_metrics_summary(self):
         """Get current monitoring metrics"""
@@ -229,8 +360,8 @@ class EnhancedCloudSpectreMonitor:
             'active_processes': len(self.cpu_usage_history),
             'memory_tracked_processes': len(self.memory_patterns),
             'recent_process_creations': len([
-                t for t in self.process_creation_times.values() 
-                if time.time() - t < 60
+                t for pid, t in self.process_creation_times.items()
+                if pid in self._last_pids and time.time() - t < 60
             ]),
             'monitoring_uptime': time.time() if self.running else 0
         }
@@ -7,6 +7,7 @@ import json
 import subprocess
 import logging
 import threading
+from collections import deque
 from datetime import datetime
 from typing import Dict, List, Optional
 import psutil
@@ -18,6 +19,9 @@ from influxdb_client.client.write_api import SYNCHRONOUS
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Shortest gap between psutil.cpu_percent reads, in seconds
+CPU_PERCENT_MIN_INTERVAL = 0.1
+
 class SpectreMetricsCollector:
     def __init__(self):
         self.influx_client = None
@@ -26,6 +30,11 @@ class SpectreMetricsCollector:
         self.load_config()
         self.baseline_data = {}
         self.anomaly_threshold = 3.0  # Standard deviations
+
+        # Prime psutil's CPU counters so later non-blocking reads have a reference
+        psutil.cpu_percent(interval=None)
+        self.cpu_percent = 0.0
+        self.cpu_percent_time = time.monotonic()
         
     def setup_influxdb(self):
         """Initialize InfluxDB connection"""
@@ -155,7 +164,13 @@ class SpectreMetricsCollector:
     def collect_system_metrics(self) -> Dict:
         """Collect additional system metrics"""
         try:
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # Non-blocking: utilization since the previous read. Reads closer together
+            # than CPU_PERCENT_MIN_INTERVAL are too noisy, so reuse the last value.
+            now = time.monotonic()
+            if now - self.cpu_percent_time >= CPU_PERCENT_MIN_INTERVAL:
+                self.cpu_percent = psutil.cpu_percent(interval=None)
+                self.cpu_percent_time = now
+            cpu_percent = self.cpu_percent
             memory = psutil.virtual_memory()
             load_avg = os.getloadavg()
             
@@ -205,7 +220,7 @@ class SpectreMetricsCollector:
             
             if metric_name not in self.baseline_data:
                 self.baseline_data[metric_name] = {
-                    'values': [],
+                    'values': deque(maxlen=1000),  # Keep only last 1000 values for baseline
                     'mean': 0,
                     'std': 1
                 }
@@ -213,14 +228,11 @@ class SpectreMetricsCollector:
             baseline = self.baseline_data[metric_name]
             baseline['values'].append(value)
             
-            # Keep only last 1000 values for baseline
-            if len(baseline['values']) > 1000:
-                baseline['values'] = baseline['values'][-1000:]
-            
             # Update statistics if we have enough data
             if len(baseline['values']) >= 10:
-                baseline['mean'] = np.mean(baseline['values'])
-                baseline['std'] = max(np.std(baseline['values']), 0.1)  # Minimum std
+                values = np.fromiter(baseline['values'], dtype=np.float64, count=len(baseline['values']))
+                baseline['mean'] = values.mean()
+                baseline['std'] = max(values.std(), 0.1)  # Minimum std
     
     def write_to_influxdb(self, metrics: Dict, anomalies: List[Dict]):
         """Write metrics and anomalies to InfluxDB"""